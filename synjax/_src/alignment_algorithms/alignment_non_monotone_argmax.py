@@ -0,0 +1,108 @@
+# Copyright 2023 DeepMind Technologies Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Implements linear assignment for non-monotone alignment in Numba.
+
+Based on the shortest augmenting path algorithm from Jonker and Volgenant
+(1987): https://link.springer.com/article/10.1007/BF02278710
+"""
+from __future__ import annotations
+
+from typing import Any
+
+import numba
+import numpy as np
+
+
+NPArray = Any
+
+
+@numba.njit
+def _shortest_augmenting_path(cost: np.ndarray) -> np.ndarray:
+  """Finds the minimum cost perfect matching of a square matrix.
+
+  References:
+    https://cp-algorithms.com/graph/hungarian-algorithm.html
+
+  Args:
+    cost: Square matrix of costs.
+  Returns:
+    Array in which element at position i is the column assigned to row i, or
+    -1 everywhere if no assignment has a finite cost.
+  """
+  n = cost.shape[0]
+  # Position 0 is a sentinel in all arrays, rows and columns start from 1.
+  u = np.zeros(n+1)
+  v = np.zeros(n+1)
+  p = np.zeros(n+1, dtype=np.int64)  # Row assigned to each column.
+  way = np.zeros(n+1, dtype=np.int64)
+  for i in range(1, n+1):
+    p[0] = i
+    j0 = 0
+    minv = np.full(n+1, np.inf)
+    used = np.zeros(n+1, dtype=np.bool_)
+    while True:
+      used[j0] = True
+      i0 = p[j0]
+      delta = np.inf
+      j1 = 0
+      for j in range(1, n+1):
+        if not used[j]:
+          cur = cost[i0-1, j-1] - u[i0] - v[j]
+          if cur < minv[j]:
+            minv[j] = cur
+            way[j] = j0
+          if minv[j] < delta:
+            delta = minv[j]
+            j1 = j
+      if delta == np.inf:
+        # No free column is reachable with a finite cost.
+        return np.full(n, -1, dtype=np.int32)
+      for j in range(n+1):
+        if used[j]:
+          u[p[j]] += delta
+          v[j] -= delta
+        else:
+          minv[j] -= delta
+      j0 = j1
+      if p[j0] == 0:
+        break
+    while j0 != 0:
+      j1 = way[j0]
+      p[j0] = p[j1]
+      j0 = j1
+  cols = np.empty(n, dtype=np.int32)
+  for j in range(1, n+1):
+    cols[p[j]-1] = j-1
+  return cols
+
+
+@numba.njit(parallel=True)
+def _batched_shortest_augmenting_path(cost: np.ndarray, out: np.ndarray):
+  for b in numba.prange(cost.shape[0]):
+    out[b] = _shortest_augmenting_path(cost[b])
+
+
+def vectorized_linear_sum_assignment(log_potentials: NPArray) -> NPArray:
+  """Numpy maximum weight matching that supports batch dimensions."""
+  *batch_shape, n, _ = log_potentials.shape
+  cost = np.ascontiguousarray(-log_potentials.reshape(-1, n, n),
+                              dtype=np.float64)
+  if np.any(np.isnan(cost) | (cost == -np.inf)):
+    raise ValueError("matrix contains invalid numeric entries")
+  out = np.empty(cost.shape[:-1], dtype=np.int32)
+  _batched_shortest_augmenting_path(cost, out)
+  if np.any(out < 0):
+    raise ValueError("cost matrix is infeasible")
+  return out.reshape(*batch_shape, n)
@@ -15,6 +15,7 @@
 """Distribution of monotone alignments between two sequences."""
 # pylint: disable=g-multiple-import, g-importing-member
 from typing import Optional, Tuple, List
+import equinox as eqx
 import jax
 import jax.numpy as jnp
 from jaxtyping import Array, Float, Int32, PyTree
@@ -41,6 +42,7 @@ class GeneralMonotoneAlignmentCRF(SemiringDistribution):
   log_potentials_vertical: Optional[Float[Array, "*batch row col"]]
   lengths_rows: Int32[Array, "*batch"]
   lengths_cols: Int32[Array, "*batch"]
+  num_horizontal_moves: int = eqx.static_field()
 
   @typed
   def __init__(
@@ -51,7 +53,8 @@ class GeneralMonotoneAlignmentCRF(SemiringDistribution):
       # otherwise. Tuple type is check explicitly later with isinstance.
       log_potentials_vertical: Optional[Float[Array, "*batch row col"]], *,
       lengths_rows: Optional[Int32[Array, "*batch"]] = None,
-      lengths_cols: Optional[Int32[Array, "*batch"]] = None):
+      lengths_cols: Optional[Int32[Array, "*batch"]] = None,
+      num_horizontal_moves: Optional[int] = None):
     """Creates an AlignmentCRF distribution.
 
     Args:
@@ -72,11 +75,21 @@ class GeneralMonotoneAlignmentCRF(SemiringDistribution):
       lengths_rows: Optional jax.Array with the number of rows in each instance.
       lengths_cols: Optional jax.Array with the number of columns in
                     each instance.
+      num_horizontal_moves: Optional number of horizontal moves that all share
+                            the same log-potentials. If provided,
+                            log_potentials_horizontal must contain only one
+                            array that is reused for each of the moves
+                            instead of being passed multiple times.
     """
     super().__init__(log_potentials=None, struct_is_isomorphic_to_params=False)
     if not isinstance(log_potentials_horizontal, tuple):
       raise ValueError("log_potentials_horizontal must be a tuple.")
-    if len(log_potentials_horizontal)+(log_potentials_vertical is not None) < 2:
+    if num_horizontal_moves is None:
+      num_horizontal_moves = len(log_potentials_horizontal)
+    elif len(log_potentials_horizontal) != 1:
+      raise ValueError("Shared horizontal log-potentials must be passed as "
+                       "a tuple with a single array.")
+    if num_horizontal_moves+(log_potentials_vertical is not None) < 2:
       # Explicit check needed here because jaxtyping checks fail sometimes.
       raise ValueError("Arguments log-potentials must have the same shape.")
     rows, cols = log_potentials_horizontal[0].shape[-2:]
@@ -93,6 +106,7 @@ class GeneralMonotoneAlignmentCRF(SemiringDistribution):
     self.log_potentials_vertical = log_potentials_vertical
     self.lengths_rows = lengths_rows
     self.lengths_cols = lengths_cols
+    self.num_horizontal_moves = num_horizontal_moves
 
   @property
   def batch_shape(self) -> Shape:
@@ -126,11 +140,17 @@ class GeneralMonotoneAlignmentCRF(SemiringDistribution):
       key: Key) -> Float[Array, "s"]:
     rows, cols = self.event_shape
     init_state = semiring.wrap(jnp.full(rows, -INF).at[0].set(0))
-    keys = jax.random.split(key, cols*len(self.log_potentials_horizontal)
+    keys = jax.random.split(key, cols*self.num_horizontal_moves
                             ).reshape(cols, -1, 2)
 
     def loop(state, inp):
       scores, scores_vert, keys = inp
+      if len(scores) < self.num_horizontal_moves:
+        scores = scores * self.num_horizontal_moves
+      # Masking of moves is done per column so that shared log-potentials are
+      # read only once.
+      scores = [jnp.where(jnp.arange(rows) >= shift, score, -INF)
+                for shift, score in enumerate(scores)]
       out_state = semiring.mul(state, scores[0])
       for shift, score in enumerate(scores[1:], 1):
         transition = semiring.mul(score, jnp.roll(state, shift=shift, axis=-1))
@@ -146,7 +166,7 @@ class GeneralMonotoneAlignmentCRF(SemiringDistribution):
       return out_state, out_state
     if get_config().checkpoint_loops:
       loop = jax.checkpoint(loop)
-    lp, lp_vert = self._masked_params()
+    lp, lp_vert = self._masked_params(mask_moves=False)
     lp = [jnp.moveaxis(semiring.wrap(x+base_struct), -1, 0) for x in lp]
     if lp_vert is not None:
       lp_vert = jnp.moveaxis(semiring.wrap(lp_vert+base_struct), -1, 0)
@@ -154,13 +174,17 @@ class GeneralMonotoneAlignmentCRF(SemiringDistribution):
     return outputs[self.lengths_cols-1, :, self.lengths_rows-1]
 
   @typed
-  def _masked_params(self) -> Tuple[List[Float[Array, "*batch row col"]],
-                                    Optional[Float[Array, "*batch row col"]]]:
+  def _masked_params(self, mask_moves: bool = True
+                     ) -> Tuple[List[Float[Array, "*batch row col"]],
+                                Optional[Float[Array, "*batch row col"]]]:
     rows, _ = self.event_shape
     lp_h, lp_v = self.log_potentials_horizontal, self.log_potentials_vertical
     lp_h = [x.at[..., 0].set(-INF * (jnp.arange(rows) > 0)) for x in lp_h]
-    lp_h = [jnp.where(jnp.arange(rows)[:, None] >= i, x, -INF)
-            for i, x in enumerate(lp_h)]
+    if mask_moves:
+      if len(lp_h) < self.num_horizontal_moves:
+        lp_h = lp_h * self.num_horizontal_moves
+      lp_h = [jnp.where(jnp.arange(rows)[:, None] >= i, x, -INF)
+              for i, x in enumerate(lp_h)]
     if lp_v is not None:
       lp_v = lp_v.at[..., 0, :].set(-INF)
     return lp_h, lp_v
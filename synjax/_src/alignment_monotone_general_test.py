@@ -28,7 +28,7 @@ class GeneralMonotoneAlignmentCrfTest(distribution_test.DistributionTest):
   def analytic_log_count(self, dist: distribution_test.Distribution
                          ) -> jax.Array:
     if dist.log_potentials_vertical is not None and (
-        len(dist.log_potentials_horizontal) == 2):
+        dist.num_horizontal_moves == 2):
       return special.log_delannoy(
           dist.lengths_rows-1, dist.lengths_cols-1,
           max_input_value=min(*dist.event_shape))
@@ -48,6 +48,19 @@ class GeneralMonotoneAlignmentCrfTest(distribution_test.DistributionTest):
     dists = [GeneralMonotoneAlignmentCRF((step_0, step_1), step_0)]
     return dists
 
+  def test_shared_horizontal_log_potentials(self):
+    b, m, n = 3, 5, 6
+    step = jax.random.normal(jax.random.PRNGKey(0), (b, m, n))
+    for vertical in (step, None):
+      dist = GeneralMonotoneAlignmentCRF((step, step), vertical)
+      shared_dist = GeneralMonotoneAlignmentCRF((step,), vertical,
+                                                num_horizontal_moves=2)
+      self.assert_allclose(dist.log_partition(), shared_dist.log_partition())
+      self.assert_allclose(dist.marginals(), shared_dist.marginals())
+      best = dist.argmax()
+      self.assert_allclose(dist.unnormalized_log_prob(best),
+                           shared_dist.unnormalized_log_prob(best))
+
   def test_crash_on_invalid_shapes(self):
     b = 3
     m = 5
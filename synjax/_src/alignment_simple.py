@@ -15,7 +15,9 @@
 """Distribution of alignments between two sequences."""
 from __future__ import annotations
 # pylint: disable=g-multiple-import, g-importing-member
+import concurrent.futures
 from functools import partial
+import os
 from typing import Optional, Tuple, Literal, Union
 import equinox as eqx
 import jax
@@ -23,38 +25,298 @@ import jax.numpy as jnp
 from jaxtyping import Array, Float, Int32
 import numpy as np
 import scipy
+try:
+  import lapjv  # pytype: disable=import-error
+except ImportError:
+  lapjv = None
 from synjax._src.alignment_monotone_general import GeneralMonotoneAlignmentCRF
+from synjax._src.config import get_config
 from synjax._src.constants import INF
 from synjax._src.distribution import Distribution
 from synjax._src.typing import Shape, Key, typed
 
 
-def _numpy_non_monotone_align(log_potentials):
-  vectorized_linear_sum_assignment = np.vectorize(
-      partial(scipy.optimize.linear_sum_assignment, maximize=True),
-      signature="(n, n)->(n),(n)")
-  i, j = vectorized_linear_sum_assignment(log_potentials)
-  one_hot = lambda x: np.arange(log_potentials.shape[-1]) == x[..., None]
-  return np.sum(one_hot(i)[..., :, None]*one_hot(j)[..., None, :], axis=-3,
-                dtype=np.float32)
+ArgmaxAlgorithmName = Literal["hungarian_cover", "shortest_augmenting_path",
+                              "scipy", "lapjv", "numba"]
+
+_THREAD_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count())
+
+
+def _numpy_non_monotone_align(log_potentials, use_lapjv: bool = False):
+  """Solves each batch element with SciPy or lapjv in parallel threads."""
+  *batch_shape, n, _ = log_potentials.shape
+  log_potentials = log_potentials.reshape(-1, n, n)
+  if use_lapjv:
+    # lapjv minimizes the cost and its SIMD kernels work on float32, so
+    # float64 inputs lose precision.
+    cost = np.ascontiguousarray(-log_potentials, dtype=np.float32)
+    # lapjv corrupts memory on non-finite cost instead of reporting it.
+    if not np.all(np.isfinite(cost)):
+      raise ValueError("cost matrix is infeasible")
+    solve = lambda x: lapjv.lapjv(x)[0]
+  else:
+    # SciPy works with float64 so the whole batch is converted at once.
+    cost = np.ascontiguousarray(log_potentials, dtype=np.float64)
+    solve = lambda x: scipy.optimize.linear_sum_assignment(x, maximize=True)[1]
+  if cost.shape[0] > 1:
+    assignments = _THREAD_POOL.map(solve, cost)
+  else:
+    assignments = map(solve, cost)
+  cols = np.empty(cost.shape[:-1], dtype=np.int32)
+  for b, j in enumerate(assignments):
+    cols[b] = j
+  return cols.reshape(*batch_shape, n)
+
+
+def _numba_non_monotone_align(log_potentials):
+  """Solves all batch elements with parallel Numba code."""
+  # The import is located here so that if users do not call Numba code the
+  # Numba compilation won't be triggered and potential irrelevant
+  # compilation errors won't appear.
+  # pylint: disable=g-import-not-at-top
+  # pylint: disable=import-outside-toplevel
+  from synjax._src.alignment_algorithms import alignment_non_monotone_argmax
+  return alignment_non_monotone_argmax.vectorized_linear_sum_assignment(
+      log_potentials)
 
 
-@jax.custom_gradient
 @typed
-def _jax_non_monotone_align_callback(log_potentials: Float[Array, "*b n n"],
-                                     lenghts: Int32[Array, "*b"]):
-  """Computes non-monotone alignment using JAX pure callback to NumPy."""
+def _shortest_augmenting_path(log_potentials: Float[Array, "n n"]
+                              ) -> Int32[Array, "n"]:
+  """Finds the maximum weight perfect matching of a square matrix.
+
+  Shortest augmenting path variant of the Hungarian algorithm that runs in
+  O(n^3) time with each of the inner loops over columns vectorized. If no
+  assignment has a finite score then all of them are maximal and the identity
+  assignment is returned. Scores that are NaN or +inf are invalid and every
+  row is then assigned to column -1.
+
+  References:
+    Jonker and Volgenant, 1987: https://link.springer.com/article/10.1007/BF02278710
+    https://cp-algorithms.com/graph/hungarian-algorithm.html
+
+  Args:
+    log_potentials: Square matrix of scores.
+  Returns:
+    Array in which element at position i is the column assigned to row i.
+  """  # pylint: disable=line-too-long
   n = log_potentials.shape[-1]
-  mask = jnp.arange(n) < lenghts[..., None]
-  mask = mask[..., None] * mask[..., None, :]
-  log_potentials = jnp.where(mask, log_potentials, -INF)
-  diag_mask = (jnp.arange(n) >= lenghts[..., None, None]) * jnp.eye(n)
-  log_potentials = jnp.where(diag_mask, INF, log_potentials)
-  alignments = jax.pure_callback(
-      _numpy_non_monotone_align, jax.ShapeDtypeStruct(log_potentials.shape,
-                                                      jnp.float32),
-      log_potentials)
-  return alignments*mask, lambda g: (jnp.zeros_like(log_potentials), None)
+  # Invalid scores are replaced so that the loops below still terminate.
+  invalid = jnp.any(jnp.isnan(log_potentials) | (log_potentials == jnp.inf))
+  log_potentials = jnp.where(invalid, 0, log_potentials)
+  # Row 0 and column 0 are sentinels needed by the algorithm.
+  cost = jnp.zeros((n+1, n+1), log_potentials.dtype
+                   ).at[1:, 1:].set(-log_potentials)
+
+  def add_row(i, state):
+    # Duals of rows, duals of columns, row assigned to column.
+    u, v, p, infeasible = state
+    p = p.at[0].set(i)
+
+    def search_step(search_state):
+      j0, u, v, minv, way, used, _ = search_state
+      used = used.at[j0].set(True)
+      i0 = p[j0]
+      cur = cost[i0] - u[i0] - v
+      improved = ~used & (cur < minv)
+      minv = jnp.where(improved, cur, minv)
+      way = jnp.where(improved, j0, way)
+      free_minv = jnp.where(used, jnp.inf, minv)
+      j1 = jnp.argmin(free_minv).astype(jnp.int32)
+      delta = free_minv[j1]
+      u = u.at[p].add(jnp.where(used, delta, 0))
+      v = jnp.where(used, v-delta, v)
+      minv = jnp.where(used, minv, minv-delta)
+      # No free column is reachable with a finite score.
+      infeasible = ~jnp.isfinite(delta)
+      return j1, u, v, minv, way, used, infeasible
+
+    minv = jnp.full(n+1, jnp.inf, cost.dtype)
+    way = jnp.zeros(n+1, jnp.int32)
+    used = jnp.zeros(n+1, bool)
+    j0, u, v, _, way, _, infeasible = jax.lax.while_loop(
+        lambda x: (p[x[0]] != 0) & ~x[6], search_step,
+        (jnp.int32(0), u, v, minv, way, used, infeasible))
+
+    def augment_step(augment_state):
+      j0, p = augment_state
+      j1 = way[j0]
+      return j1, p.at[j0].set(p[j1])
+
+    _, p = jax.lax.while_loop(lambda x: x[0] != 0, augment_step,
+                              (jnp.where(infeasible, 0, j0), p))
+    return u, v, p, infeasible
+
+  u = jnp.zeros(n+1, cost.dtype)
+  v = jnp.zeros(n+1, cost.dtype)
+  p = jnp.zeros(n+1, jnp.int32)
+  _, _, p, infeasible = jax.lax.fori_loop(1, n+1, add_row,
+                                          (u, v, p, jnp.array(False)))
+  identity = jnp.arange(n, dtype=jnp.int32)
+  cols = jnp.zeros(n, jnp.int32).at[p[1:]-1].set(identity)
+  return jnp.where(invalid, -1, jnp.where(infeasible, identity, cols))
+
+
+@typed
+def _hungarian_cover(log_potentials: Float[Array, "n n"]) -> Int32[Array, "n"]:
+  """Finds the maximum weight perfect matching of a square matrix.
+
+  Munkres' version of the Hungarian algorithm that alternates between covering
+  zeros with lines and adjusting uncovered entries. It runs in O(n^4) time so
+  on CPU the O(n^3) solvers are much faster, but each of its steps is a dense
+  operation over the whole matrix, which can pay off on accelerators such as
+  TPUs. If no assignment has a finite score then all of them are maximal and
+  the identity assignment is returned. Scores that are NaN or +inf are invalid
+  and every row is then assigned to column -1.
+
+  References:
+    Munkres, 1957: https://www.jstor.org/stable/2098689
+    https://github.com/google-research/scenic/blob/main/scenic/model_lib/matchers/hungarian_cover.py
+
+  Args:
+    log_potentials: Square matrix of scores.
+  Returns:
+    Array in which element at position i is the column assigned to row i.
+  """  # pylint: disable=line-too-long
+  n = log_potentials.shape[-1]
+  # Invalid scores are replaced so that the loops below still terminate.
+  invalid = jnp.any(jnp.isnan(log_potentials) | (log_potentials == jnp.inf))
+  cost = -jnp.where(invalid, 0, log_potentials)
+  cost -= jnp.min(cost, axis=-1, keepdims=True)
+  cost -= jnp.min(cost, axis=-2, keepdims=True)
+
+  def star_greedily(i, stars):
+    free_zeros = (cost[i] == 0) & ~jnp.any(stars, axis=-2)
+    return stars.at[i, jnp.argmax(free_zeros)].set(jnp.any(free_zeros))
+
+  # All starred zeros are independent, i.e. they form a partial assignment.
+  stars = jax.lax.fori_loop(0, n, star_greedily, jnp.zeros((n, n), bool))
+
+  def prime_step(state):
+    cost, stars, row_cover, col_cover, primes, _, _, _, _ = state
+    uncovered = ~row_cover[:, None] & ~col_cover[None, :]
+    zeros = uncovered & (cost == 0)
+    has_zero = jnp.any(zeros)
+    i, j = jnp.divmod(jnp.argmax(zeros).astype(jnp.int32), n)
+    star_in_row = jnp.any(stars[i])
+    star_col = jnp.argmax(stars[i])
+    # If there is no uncovered zero, create one by shifting the cost.
+    shift = jnp.min(jnp.where(uncovered, cost, jnp.inf))
+    # Without a finite uncovered entry no assignment has a finite score.
+    infeasible = ~has_zero & ~jnp.isfinite(shift)
+    covered_twice = row_cover[:, None] & col_cover[None, :]
+    shifted_cost = jnp.where(covered_twice, cost+shift,
+                             jnp.where(uncovered, cost-shift, cost))
+    cost = jnp.where(has_zero, cost, shifted_cost)
+    primes = primes.at[i, j].set(primes[i, j] | has_zero)
+    # If the primed zero shares a row with a starred zero, cover that row
+    # and uncover the column of the starred zero.
+    cover_row = has_zero & star_in_row
+    row_cover = row_cover.at[i].set(row_cover[i] | cover_row)
+    col_cover = col_cover.at[star_col].set(col_cover[star_col] & ~cover_row)
+    found = has_zero & ~star_in_row
+    return cost, stars, row_cover, col_cover, primes, found, infeasible, i, j
+
+  def augment_step(state):
+    i, j, stars, primes, _ = state
+    star_in_col = jnp.any(stars[:, j])
+    star_row = jnp.argmax(stars[:, j])
+    stars = stars.at[star_row, j].set(stars[star_row, j] & ~star_in_col)
+    stars = stars.at[i, j].set(True)
+    return (star_row.astype(jnp.int32),
+            jnp.argmax(primes[star_row]).astype(jnp.int32),
+            stars, primes, star_in_col)
+
+  def cover_step(state):
+    cost, stars, infeasible = state
+    # Under vmap this step also runs for already solved batch elements so the
+    # inner loops must terminate immediately for them.
+    is_done = (jnp.sum(stars) == n) | infeasible
+    init_state = (cost, stars, jnp.zeros(n, bool), jnp.any(stars, axis=-2),
+                  jnp.zeros((n, n), bool), is_done, infeasible,
+                  jnp.int32(0), jnp.int32(0))
+    cost, _, _, _, primes, _, infeasible, i, j = jax.lax.while_loop(
+        lambda x: ~x[5] & ~x[6], prime_step, init_state)
+    # Alternating path of primed and starred zeros increases the assignment.
+    _, _, stars, _, _ = jax.lax.while_loop(
+        lambda x: x[4], augment_step,
+        (i, j, stars, primes, ~is_done & ~infeasible))
+    return cost, stars, infeasible
+
+  _, stars, infeasible = jax.lax.while_loop(
+      lambda x: (jnp.sum(x[1]) < n) & ~x[2], cover_step,
+      (cost, stars, jnp.array(False)))
+  cols = jnp.where(infeasible, jnp.arange(n, dtype=jnp.int32),
+                   jnp.argmax(stars, axis=-1).astype(jnp.int32))
+  return jnp.where(invalid, -1, cols)
+
+
+@jax.jit
+@typed
+def _pad_non_monotone_log_potentials(
+    log_potentials: Float[Array, "*b n n"], lengths: Int32[Array, "*b"]
+    ) -> Float[Array, "*b n n"]:
+  """Masks log-potentials so that padding rows align to themselves."""
+  n = log_potentials.shape[-1]
+  idx = jnp.arange(n)
+  is_valid = idx < lengths[..., None]
+  mask = is_valid[..., :, None] & is_valid[..., None, :]
+  is_padding_diag = (idx[:, None] == idx) & ~is_valid[..., :, None]
+  return jnp.where(mask, log_potentials, jnp.where(is_padding_diag, INF, -INF))
+
+
+@typed
+def _jax_non_monotone_align(log_potentials: Float[Array, "*b n n"],
+                            algorithm: Optional[ArgmaxAlgorithmName] = None
+                            ) -> Int32[Array, "*b n"]:
+  """Computes the column aligned to each row with a linear assignment solver."""
+  if algorithm is None:
+    algorithm = get_config().non_monotone_alignment_argmax_algorithm
+  if algorithm == "hungarian_cover":
+    solver = _hungarian_cover
+  elif algorithm == "shortest_augmenting_path":
+    solver = _shortest_augmenting_path
+  elif algorithm in ("scipy", "lapjv", "numba"):
+    if algorithm == "numba":
+      callback = _numba_non_monotone_align
+    else:
+      if algorithm == "lapjv" and lapjv is None:
+        raise ImportError(
+            "Algorithm 'lapjv' requires the optional lapjv package.")
+      callback = partial(_numpy_non_monotone_align,
+                         use_lapjv=algorithm == "lapjv")
+    solver = lambda x: jax.pure_callback(
+        callback, jax.ShapeDtypeStruct(x.shape[:-1], jnp.int32), x,
+        vectorized=True)
+  else:
+    raise NotImplementedError
+  return jnp.vectorize(solver, signature="(n,n)->(n)")(
+      jax.lax.stop_gradient(log_potentials))
+
+
+@jax.jit
+def _non_monotone_unnormalized_log_prob(event: jax.Array,
+                                        log_potentials: jax.Array
+                                        ) -> jax.Array:
+  # Jitted so that eager calls in training loops dispatch a single kernel.
+  return jnp.sum(event * log_potentials, (-1, -2))
+
+
+@jax.jit
+def _non_monotone_indices_unnormalized_log_prob(cols: jax.Array,
+                                                log_potentials: jax.Array,
+                                                lengths: Optional[jax.Array]
+                                                ) -> jax.Array:
+  sample_ndim = cols.ndim - log_potentials.ndim + 1
+  log_potentials = log_potentials.reshape(
+      (1,)*sample_ndim + log_potentials.shape)
+  scores = jnp.take_along_axis(log_potentials, cols[..., None], axis=-1)[..., 0]
+  # Column -1 marks rows of invalid log-potentials.
+  scores = jnp.where(cols < 0, jnp.nan, scores)
+  if lengths is not None:
+    scores = jnp.where(jnp.arange(cols.shape[-1]) < lengths[..., None],
+                       scores, 0)
+  return jnp.sum(scores, -1)
 
 
 class AlignmentCRF(Distribution):
@@ -68,7 +330,7 @@ class AlignmentCRF(Distribution):
   """
 
   _log_potentials: Float[Array, "*batch row col"]
-  _lengths: Int32[Array, "*batch"]
+  _lengths_rows: Optional[Int32[Array, "*batch"]]
   _dist: Optional[GeneralMonotoneAlignmentCRF]
   alignment_type: str = eqx.static_field()
 
@@ -88,21 +350,19 @@ class AlignmentCRF(Distribution):
       raise ValueError("This is a useless distribution because there is "
                        "less than two alignment possible.")
 
-    if lengths_rows is not None:
-      self._lengths = lengths_rows
-    else:
-      self._lengths = jnp.full(log_potentials.shape[:-2],
-                               log_potentials.shape[-1])
+    self._lengths_rows = lengths_rows
     if alignment_type == "monotone_one_to_many":
       self._dist = GeneralMonotoneAlignmentCRF(
-          log_potentials_horizontal=(log_potentials, log_potentials),
+          log_potentials_horizontal=(log_potentials,),
           log_potentials_vertical=None,
-          lengths_rows=lengths_rows, lengths_cols=lengths_cols)
+          lengths_rows=lengths_rows, lengths_cols=lengths_cols,
+          num_horizontal_moves=2)
     elif alignment_type == "monotone_many_to_many":
       self._dist = GeneralMonotoneAlignmentCRF(
-          log_potentials_horizontal=(log_potentials, log_potentials),
+          log_potentials_horizontal=(log_potentials,),
           log_potentials_vertical=log_potentials,
-          lengths_rows=lengths_rows, lengths_cols=lengths_cols)
+          lengths_rows=lengths_rows, lengths_cols=lengths_cols,
+          num_horizontal_moves=2)
     elif alignment_type == "non_monotone_one_to_one":
       self._dist = None
       if lengths_cols is not None:
@@ -149,10 +409,30 @@ class AlignmentCRF(Distribution):
       return self._dist.log_prob(event, **kwargs)
 
   @typed
-  def unnormalized_log_prob(self, event: Float[Array, "*b n m"], **kwargs
-                            ) -> Float[Array, "*b"]:
+  def unnormalized_log_prob(
+      self, event: Union[Float[Array, "*b n m"], Int32[Array, "*b n"]],
+      **kwargs) -> Float[Array, "*b"]:
+    """Computes unnormalized log-probability of a structure.
+
+    Args:
+      event: Structure for which log-probability is computed. Non-monotone
+             alignment also accepts the compact representation returned by
+             argmax_indices(), which is the only accepted integer event.
+      **kwargs: Keyword arguments for the underlying distribution.
+    Returns:
+      Unnormalized log-probability of the structure.
+    """
     if self.alignment_type == "non_monotone_one_to_one":
-      return jnp.einsum("...ij,...ij->...", event, self._log_potentials)
+      if jnp.issubdtype(event.dtype, jnp.integer):
+        # Dense alignments of integer type would otherwise be read as indices.
+        shape = self._log_potentials.shape
+        if (event.shape[event.ndim-len(shape)+1:] != shape[:-1]
+            or event.shape[event.ndim-len(shape):] == shape):
+          raise ValueError("Integer events must be column indices of shape "
+                           f"{shape[:-1]}, got shape {event.shape}.")
+        return _non_monotone_indices_unnormalized_log_prob(
+            event, self._log_potentials, self._lengths_rows)
+      return _non_monotone_unnormalized_log_prob(event, self._log_potentials)
     else:
       return self._dist.unnormalized_log_prob(event, **kwargs)
 
@@ -184,16 +464,50 @@ class AlignmentCRF(Distribution):
   @typed
   def argmax(self, **kwargs) -> Float[Array, "*batch n m"]:
     if self.alignment_type == "non_monotone_one_to_one":
-      return _jax_non_monotone_align_callback(self._log_potentials,
-                                              self._lengths)
+      return self._indices_to_alignment(self.argmax_indices(**kwargs))
     else:
       return self._dist.argmax(**kwargs)
 
+  @typed
+  def _indices_to_alignment(self, cols: Int32[Array, "*batch n"]
+                            ) -> Float[Array, "*batch n n"]:
+    n = cols.shape[-1]
+    is_aligned = cols[..., None] == jnp.arange(n)
+    if self._lengths_rows is not None:
+      # Valid rows are always aligned to valid columns.
+      is_aligned &= jnp.arange(n) < self._lengths_rows[..., None, None]
+    return is_aligned.astype(self._log_potentials.dtype)
+
+  @typed
+  def argmax_indices(self, **kwargs) -> Int32[Array, "*batch n"]:
+    """Finds the highest scoring non-monotone alignment in compact form.
+
+    Args:
+      **kwargs: Keyword arguments for the linear assignment solver.
+    Returns:
+      Array in which element at position i is the column aligned to row i.
+      Padding rows beyond lengths_rows are aligned to themselves.
+    """
+    if self.alignment_type == "non_monotone_one_to_one":
+      log_potentials = self._log_potentials
+      if self._lengths_rows is not None:
+        # Without lengths there is no padding so masking is skipped.
+        log_potentials = _pad_non_monotone_log_potentials(log_potentials,
+                                                          self._lengths_rows)
+      return _jax_non_monotone_align(log_potentials, **kwargs)
+    else:
+      raise NotImplementedError(
+          "Only non-monotone alignment supports argmax_indices.")
+
   @typed
   def argmax_and_max(self, **kwargs) -> Tuple[Float[Array, "*batch n m"],
                                               Float[Array, "*batch"]]:
-    event = self.argmax(**kwargs), self
-    return event, self.unnormalized_log_prob(event, **kwargs)
+    if self.alignment_type == "non_monotone_one_to_one":
+      # Score of the compact alignment is read only from the aligned cells.
+      cols = self.argmax_indices(**kwargs)
+      return self._indices_to_alignment(cols), self.unnormalized_log_prob(cols)
+    else:
+      return self._dist.argmax_and_max(**kwargs)
 
   @typed
   def top_k(self, k: int, **kwargs) -> Tuple[Float[Array, "k *batch n m"],
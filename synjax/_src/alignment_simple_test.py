@@ -15,8 +15,11 @@
 """Tests for alignment_simple."""
 
 from absl.testing import absltest
+from absl.testing import parameterized
 import jax
 import jax.numpy as jnp
+import numpy as np
+import scipy
 from synjax._src import alignment_simple
 from synjax._src import distribution_test
 from synjax._src.utils import special
@@ -29,7 +32,10 @@ class AlignmentCrfTest(distribution_test.DistributionTest):
   def analytic_log_count(self, dist: distribution_test.Distribution
                          ) -> jax.Array:
     if dist.alignment_type == "non_monotone_one_to_one":
-      return jax.scipy.special.gammaln(dist._lengths)
+      lengths = dist._lengths_rows
+      if lengths is None:
+        lengths = jnp.full(dist.batch_shape, dist.event_shape[-1])
+      return jax.scipy.special.gammaln(lengths)
     elif dist.alignment_type == "monotone_many_to_many":
       return special.log_delannoy(
           dist._dist.lengths_rows-1, dist._dist.lengths_cols-1,
@@ -54,6 +60,126 @@ class AlignmentCrfTest(distribution_test.DistributionTest):
       self.assertEqual(struct_potential.shape, dist.batch_shape)
       self.assert_all(struct_potential > 0)
 
+  @parameterized.parameters([dict(algorithm="hungarian_cover"),
+                             dict(algorithm="shortest_augmenting_path"),
+                             dict(algorithm="scipy"),
+                             dict(algorithm="lapjv"),
+                             dict(algorithm="numba")])
+  def test_non_monotone_argmax_matches_scipy(self, algorithm: str):
+    if algorithm == "lapjv" and alignment_simple.lapjv is None:
+      self.skipTest("The optional lapjv package is not installed.")
+    key = jax.random.PRNGKey(0)
+    b, n = 4, 7
+    log_potentials = jax.random.normal(key, (b, n, n))
+    lengths = jnp.array([7, 5, 2, 1], dtype=jnp.int32)
+    dist = AlignmentCRF(log_potentials, lengths_rows=lengths,
+                        alignment_type="non_monotone_one_to_one")
+    best = jax.jit(lambda x: x.argmax(algorithm=algorithm))(dist)
+    self.assert_zeros_and_ones(best)
+    for i, length in enumerate(lengths):
+      lp = np.asarray(log_potentials[i, :length, :length])
+      rows, cols = scipy.optimize.linear_sum_assignment(lp, maximize=True)
+      self.assert_allclose(dist.unnormalized_log_prob(best)[i],
+                           lp[rows, cols].sum())
+      self.assert_allclose(best[i].sum(), length)
+
+  @parameterized.parameters([dict(algorithm="hungarian_cover"),
+                             dict(algorithm="shortest_augmenting_path")])
+  def test_non_monotone_argmax_x64(self, algorithm: str):
+    with jax.experimental.enable_x64():
+      log_potentials = jax.random.normal(jax.random.PRNGKey(0), (2, 5, 5),
+                                         dtype=jnp.float64)
+      dist = AlignmentCRF(log_potentials,
+                          alignment_type="non_monotone_one_to_one")
+      cols = dist.argmax_indices(algorithm=algorithm)
+    for i in range(2):
+      _, expected = scipy.optimize.linear_sum_assignment(
+          np.asarray(log_potentials[i]), maximize=True)
+      self.assert_allclose(cols[i], expected)
+
+  @parameterized.parameters([dict(algorithm="hungarian_cover"),
+                             dict(algorithm="shortest_augmenting_path")])
+  def test_non_monotone_argmax_infeasible(self, algorithm: str):
+    n = 4
+    log_potentials = jax.random.normal(jax.random.PRNGKey(0), (n, n))
+    log_potentials = log_potentials.at[1].set(-jnp.inf)
+    dist = AlignmentCRF(log_potentials,
+                        alignment_type="non_monotone_one_to_one")
+    cols = jax.jit(lambda x: x.argmax_indices(algorithm=algorithm))(dist)
+    # Every assignment has a score of -inf so any of them is the argmax.
+    self.assert_allclose(jnp.sort(cols), jnp.arange(n))
+    self.assertEqual(dist.unnormalized_log_prob(cols), -jnp.inf)
+
+  @parameterized.parameters([
+      dict(algorithm="hungarian_cover", value=jnp.nan),
+      dict(algorithm="hungarian_cover", value=jnp.inf),
+      dict(algorithm="shortest_augmenting_path", value=jnp.nan),
+      dict(algorithm="shortest_augmenting_path", value=jnp.inf)])
+  def test_non_monotone_argmax_invalid(self, algorithm: str, value: float):
+    n = 4
+    log_potentials = jax.random.normal(jax.random.PRNGKey(0), (n, n))
+    log_potentials = log_potentials.at[1, 2].set(value)
+    dist = AlignmentCRF(log_potentials,
+                        alignment_type="non_monotone_one_to_one")
+    cols = jax.jit(lambda x: x.argmax_indices(algorithm=algorithm))(dist)
+    self.assert_allclose(cols, jnp.full(n, -1))
+    self.assertTrue(jnp.isnan(dist.unnormalized_log_prob(cols)))
+
+  @parameterized.parameters([dict(algorithm="scipy"),
+                             dict(algorithm="lapjv"),
+                             dict(algorithm="numba")])
+  def test_non_monotone_argmax_infeasible_raises(self, algorithm: str):
+    if algorithm == "lapjv" and alignment_simple.lapjv is None:
+      self.skipTest("The optional lapjv package is not installed.")
+    n = 4
+    log_potentials = jax.random.normal(jax.random.PRNGKey(0), (n, n))
+    log_potentials = log_potentials.at[1].set(-jnp.inf)
+    dist = AlignmentCRF(log_potentials,
+                        alignment_type="non_monotone_one_to_one")
+    with self.assertRaises(Exception):
+      jax.block_until_ready(dist.argmax_indices(algorithm=algorithm))
+
+  @parameterized.parameters([dict(algorithm="scipy", value=jnp.nan),
+                             dict(algorithm="scipy", value=jnp.inf),
+                             dict(algorithm="numba", value=jnp.nan),
+                             dict(algorithm="numba", value=jnp.inf)])
+  def test_non_monotone_argmax_invalid_raises(self, algorithm: str,
+                                              value: float):
+    n = 4
+    log_potentials = jax.random.normal(jax.random.PRNGKey(0), (n, n))
+    log_potentials = log_potentials.at[1, 2].set(value)
+    dist = AlignmentCRF(log_potentials,
+                        alignment_type="non_monotone_one_to_one")
+    with self.assertRaises(Exception):
+      jax.block_until_ready(dist.argmax_indices(algorithm=algorithm))
+
+  def test_argmax_and_max(self):
+    for dist in self.create_random_batched_dists(jax.random.PRNGKey(0)):
+      best, best_score = jax.jit(lambda x: x.argmax_and_max())(dist)
+      self.assert_allclose(best, dist.argmax())
+      self.assert_allclose(best_score, dist.unnormalized_log_prob(best))
+
+  def test_non_monotone_argmax_indices(self):
+    key = jax.random.PRNGKey(0)
+    b, n = 3, 6
+    lengths = jnp.array([6, 4, 1], dtype=jnp.int32)
+    dist = AlignmentCRF(jax.random.normal(key, (b, n, n)),
+                        lengths_rows=lengths,
+                        alignment_type="non_monotone_one_to_one")
+    cols = dist.argmax_indices()
+    self.assertEqual(cols.shape, (b, n))
+    best = dist.argmax()
+    self.assert_allclose(jnp.argmax(best, -1)[0], cols[0])
+    self.assert_allclose(dist.unnormalized_log_prob(cols),
+                         dist.unnormalized_log_prob(best))
+    self.assert_allclose(dist.unnormalized_log_prob(jnp.stack([cols, cols])),
+                         dist.unnormalized_log_prob(jnp.stack([best, best])))
+    with self.assertRaises(ValueError):
+      dist.unnormalized_log_prob(best.astype(jnp.int32))
+    best_and_max = dist.argmax_and_max()
+    self.assert_allclose(best_and_max[0], best)
+    self.assert_allclose(best_and_max[1], dist.unnormalized_log_prob(best))
+
   def create_random_batched_dists(self, key: jax.random.KeyArray):
     b, n, m = 3, 5, 6
     log_potentials = jax.random.normal(key, (b, n, m))
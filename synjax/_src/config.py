@@ -40,6 +40,11 @@ class SynJaxConfig():
   # Linear-Chain CRF settings
   linear_chain_crf_forward_algorithm: Literal["sequential", "parallel"] = (
       "sequential")
+  # Alignment CRF settings
+  # The "lapjv" algorithm solves in float32 even when jax_enable_x64 is set.
+  non_monotone_alignment_argmax_algorithm: Literal[
+      "hungarian_cover", "shortest_augmenting_path", "scipy", "lapjv",
+      "numba"] = "scipy"
 
 
 _config = SynJaxConfig()